@@ -2,14 +2,39 @@ from google.cloud import storage
 from google.cloud import pubsub_v1
 from pathlib import Path
 from concurrent import futures
+from requests.adapters import HTTPAdapter
 import os
 import json
 import re
-import glob
+import threading
+
+# uploads are bound by network round trips, not CPU
+UPLOAD_MAX_WORKERS = 32
+
+_GS_URL_RE = re.compile(r"gs://([^/]+)/(.*)")
+
+_storage_client = None
+_storage_client_lock = threading.Lock()
+
+
+def _client():
+    """Returns the process-wide storage client, created on first use."""
+    global _storage_client
+    # concurrent first calls, e.g. from the download pool, must not build two
+    with _storage_client_lock:
+        if _storage_client is None:
+            client = storage.Client()
+            # one pooled connection per upload worker
+            adapter = HTTPAdapter(
+                pool_connections=UPLOAD_MAX_WORKERS, pool_maxsize=UPLOAD_MAX_WORKERS
+            )
+            client._http.mount("https://", adapter)
+            _storage_client = client
+        return _storage_client
 
 
 def get_bucket_object_name(url: str):
-    matches = re.match("gs://(.*?)/(.*)", url)
+    matches = _GS_URL_RE.match(url)
     if matches:
         bucket, object_name = matches.groups()
     else:
@@ -27,7 +52,7 @@ def download_blob(bucket_name, source_blob_name, destination_file_name):
     # The path to which the file should be downloaded
     # destination_file_name = "local/path/to/file"
 
-    storage_client = storage.Client()
+    storage_client = _client()
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(source_blob_name)
     blob.download_to_filename(destination_file_name)
@@ -38,7 +63,9 @@ def download_blob(bucket_name, source_blob_name, destination_file_name):
     )
 
 
-def upload_blob(bucket_name, source_file_name, destination_blob_name):
+def upload_blob(
+    bucket_name, source_file_name, destination_blob_name, checksum="crc32c"
+):
     """Uploads a file to the bucket."""
     # The ID of your GCS bucket
     # bucket_name = "your-bucket-name"
@@ -46,41 +73,107 @@ def upload_blob(bucket_name, source_file_name, destination_blob_name):
     # source_file_name = "local/path/to/file"
     # The ID of your GCS object
     # destination_blob_name = "storage-object-name"
+    # The upload integrity check, "crc32c", "md5" or None to skip it
+    # checksum = "crc32c"
 
-    storage_client = storage.Client()
+    storage_client = _client()
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(destination_blob_name)
-    blob.upload_from_filename(source_file_name)
+    blob.upload_from_filename(source_file_name, checksum=checksum)
     print(f"File {source_file_name} uploaded to {destination_blob_name}.")
 
 
-def upload_blob_from_memory(bucket_name, contents, destination_blob_name):
-    storage_client = storage.Client()
+def upload_blob_from_memory(
+    bucket_name,
+    contents,
+    destination_blob_name,
+    content_type="application/octet-stream",
+):
+    storage_client = _client()
     bucket = storage_client.bucket(bucket_name)
     blob = bucket.blob(destination_blob_name)
-    blob.upload_from_string(contents)
-    print(
-        f"{destination_blob_name} with contents {contents} has been uploaded to {bucket_name}."
-    )
+    blob.upload_from_string(contents, content_type=content_type, checksum="crc32c")
+    if len(contents) < 256:
+        print(
+            f"{destination_blob_name} with contents {contents} has been uploaded to {bucket_name}."
+        )
+    else:
+        print(
+            f"{destination_blob_name} with contents of length {len(contents)} has been uploaded to {bucket_name}."
+        )
+
+
+def iter_files(directory_path: str):
+    """Recursively yields the paths of regular files under directory_path."""
+    with os.scandir(directory_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from iter_files(entry.path)
+            elif entry.is_file():
+                yield entry.path
 
 
 def upload_blobs_from_directory(
     directory_path: str, dest_bucket_name: str, dest_blob_name: str
 ):
-    storage_client = storage.Client()
-    rel_paths = glob.glob(directory_path + "/**", recursive=True)
+    storage_client = _client()
     bucket = storage_client.bucket(dest_bucket_name)
-    for local_file in rel_paths:
-        remote_path = f'{dest_blob_name}/{"/".join(local_file.split(os.sep)[2:])}'
-        if os.path.isfile(local_file):
+    with futures.ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as executor:
+        upload_futures = []
+        for local_file in iter_files(directory_path):
+            rel_path = os.path.relpath(local_file, directory_path)
+            remote_path = f'{dest_blob_name}/{rel_path.replace(os.sep, "/")}'
             blob = bucket.blob(remote_path)
-            blob.upload_from_filename(local_file)
+            upload_futures.append(
+                executor.submit(
+                    blob.upload_from_filename, local_file, checksum="crc32c"
+                )
+            )
+        # surface the first failed upload, if any
+        for future in futures.as_completed(upload_futures):
+            future.result()
 
     print(
         f"Folder: {directory_path} has been uploaded to {dest_bucket_name}/{dest_blob_name}."
     )
 
 
+def download_blobs_to_directory(
+    src_bucket_name: str,
+    src_blob_name: str,
+    directory_path: str,
+    suffix: str = "",
+    max_blobs: int = None,
+):
+    """Downloads the blobs under src_blob_name ending with suffix, keeping their relative paths.
+
+    With max_blobs, only the most recently updated ones are downloaded.
+    """
+    storage_client = _client()
+    blobs = [
+        blob
+        for blob in storage_client.list_blobs(src_bucket_name, prefix=src_blob_name + "/")
+        if blob.name.endswith(suffix)
+    ]
+    if max_blobs is not None:
+        blobs = sorted(blobs, key=lambda blob: blob.updated, reverse=True)[:max_blobs]
+    with futures.ThreadPoolExecutor(max_workers=UPLOAD_MAX_WORKERS) as executor:
+        download_futures = []
+        for blob in blobs:
+            rel_path = blob.name[len(src_blob_name) + 1:]
+            local_file = os.path.join(directory_path, *rel_path.split("/"))
+            Path(local_file).parent.mkdir(parents=True, exist_ok=True)
+            download_futures.append(
+                executor.submit(blob.download_to_filename, local_file)
+            )
+        for future in futures.as_completed(download_futures):
+            future.result()
+
+    print(
+        f"Folder: {src_bucket_name}/{src_blob_name} has been downloaded to {directory_path}."
+    )
+
+
 def download_file_from_gcp(bucket_name, blob_name, dst_folder, dst_name: str):
     output_dir = Path(dst_folder)
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -1,45 +1,114 @@
 import traceback
 import argparse
 from pathlib import Path
+from concurrent import futures
 import os
 
-from dlacc.optimum import Optimum
-from dlacc.utils import (
-    convert2onnx,
-    JSONConfig,
-    JSONOutput,
-)
-from dlacc.metadata import platformType, output_prefix, input_prefix
-from app.helpers import publish_message, download_file_from_gcp, upload_blobs_from_directory
+# enum-only module, needed to validate --env before the heavy imports in run()
+from dlacc.metadata import platformType
+
+# most recent cached logs used to warm-start the cost model
+CORPUS_MAX_LOGS = 50
+
+
+def cache_snapshot(cache_dir: str) -> dict:
+    """Maps the files of a cache folder to their modification time."""
+    if not os.path.isdir(cache_dir):
+        return {}
+    return {
+        entry.name: entry.stat().st_mtime_ns
+        for entry in os.scandir(cache_dir)
+        if entry.is_file() and not entry.name.endswith(".tmp")
+    }
+
 
 def run(args: dict) -> None:
+    from app.helpers import (
+        publish_message,
+        download_blobs_to_directory,
+        download_file_from_gcp,
+        upload_blob,
+        upload_blobs_from_directory,
+    )
+
     config_name = "config.json"
     model_name = "model.onnx"
     try:
-        if args.env == platformType.GOOGLESTORAGE:
-            download_file_from_gcp(args.input_bucket, f"job_id={str(args.job_id)}/{config_name}", input_prefix, config_name)
-            download_file_from_gcp(args.input_bucket, f"job_id={str(args.job_id)}/{model_name}", input_prefix, model_name)
-        
-        config = JSONConfig(config_name, 0)
-        onnx_model = convert2onnx(
-            0,
-            f"{input_prefix}/{model_name}",
-            config["model_type"],
-            input_shape=config["model_config"]["input_shape"],
-            input_dtype=config["model_config"]["input_dtype"],
+        # inside the try so that a broken install is still published as a failure
+        import onnx
+
+        from dlacc.optimum import Optimum
+        from dlacc.utils import (
+            get_onnx_model,
+            get_workload_key,
+            is_cache_hit,
+            JSONConfig,
+            JSONOutput,
         )
+        from dlacc.metadata import ModelType, output_prefix, input_prefix, cache_prefix
 
-        out_json = JSONOutput(config)
+        if args.env == platformType.GOOGLESTORAGE:
+            with futures.ThreadPoolExecutor(max_workers=2) as executor:
+                downloads = [
+                    executor.submit(download_file_from_gcp, args.input_bucket, f"job_id={str(args.job_id)}/{name}", input_prefix, name)
+                    for name in (config_name, model_name)
+                ]
+            for download in downloads:
+                download.result()
+        
+        config = JSONConfig(f"{input_prefix}/{config_name}")
+        model_check = None
+        if config["model_type"] == int(ModelType.ONNX):
+            # nothing to convert, parse once and validate while Relay imports it
+            with open(f"{input_prefix}/{model_name}", "rb") as f:
+                onnx_model = onnx.load_from_string(f.read())
+            check_executor = futures.ThreadPoolExecutor(max_workers=1)
+            model_check = check_executor.submit(onnx.checker.check_model, onnx_model)
+            check_executor.shutdown(wait=False)
+        else:
+            onnx_model = get_onnx_model(f"{input_prefix}/{model_name}", config["model_type"])
+
+        out_json = JSONOutput(config, progress_path=output_prefix + "/output_json.progress.jsonl")
         out_json["status"] = 1
 
+        workload_key = get_workload_key(
+            onnx_model,
+            config["model_config"]["input_shape"],
+            config["model_config"]["input_dtype"],
+            config["target"],
+        )
+        cache_dir = f"{cache_prefix}/{workload_key}"
+        cache_blob = f"ansor-cache/{workload_key}"
+        cache_bucket = args.cache_bucket or args.output_bucket
+        use_cache = config["tuning_config"].get("use_cache", True)
+        if args.env == platformType.GOOGLESTORAGE and use_cache:
+            # this workload's tuning log and Relay module if any
+            download_blobs_to_directory(cache_bucket, cache_blob, cache_dir)
+            needs_tuning = config["tuned_log"] == "" and not is_cache_hit(
+                cache_dir, config["tuning_config"]["num_measure_trials"]
+            )
+            if needs_tuning:
+                # every cached log, as the cost model corpus
+                download_blobs_to_directory(
+                    cache_bucket,
+                    "ansor-cache",
+                    cache_prefix,
+                    suffix="/tuning.json",
+                    max_blobs=CORPUS_MAX_LOGS,
+                )
+        cached_files = cache_snapshot(cache_dir)
+
         try:
             optimum = Optimum(out_json["model_name"])
-            optimum.run(onnx_model, out_json)
+            optimum.run(onnx_model, out_json, cache_dir=cache_dir)
         except Exception as e:
             traceback.print_exc()
             out_json["error_info"] = str(e)
             out_json["status"] = -1
 
+        if model_check is not None and model_check.exception() is not None:
+            print("ONNX checker warning: %s" % model_check.exception())
+
         if out_json["status"] != -1:
             out_json["status"] = 4
         out_json.save(output_prefix + "/output_json.json")
@@ -48,6 +117,11 @@ def run(args: dict) -> None:
             optimum.ansor_engine.evaluate()
 
         if args.env == platformType.GOOGLESTORAGE:
+            # files written or refreshed by this run, unless it failed
+            if out_json["status"] != -1:
+                for name, mtime in sorted(cache_snapshot(cache_dir).items()):
+                    if cached_files.get(name) != mtime:
+                        upload_blob(cache_bucket, f"{cache_dir}/{name}", f"{cache_blob}/{name}")
             upload_blobs_from_directory(output_prefix, args.output_bucket, "job_id=%s" % args.job_id)
             publish_message(args.project_id, args.topic_id, "OK", job_id = args.job_id, job_status = str(out_json["status"]))
 
@@ -55,50 +129,59 @@ def run(args: dict) -> None:
         publish_message(args.project_id, args.topic_id, str(e), job_id = args.job_id, job_status = "-1")
 
 
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser()
-    parser.add_argument(
-        "--env",
-        type=int,
-        help="The path of config file in json format.",
-        required=True,
-    )
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--env",
+    type=int,
+    choices=[int(env) for env in platformType],
+    help="The path of config file in json format.",
+    required=True,
+)
 
-    parser.add_argument(
-        "--job_id",
-        type=int,
-        help="The path of config file in json format.",
-        required=True,
-    )
+parser.add_argument(
+    "--job_id",
+    type=int,
+    help="The path of config file in json format.",
+    required=True,
+)
 
-    parser.add_argument(
-        "--input_bucket",
-        type=str,
-        help="The path of config file in json format.",
-        required=True,
-    )
- 
-    parser.add_argument(
-        "--output_bucket",
-        type=str,
-        help="The path of config file in json format.",
-        required=True,
-    )
+parser.add_argument(
+    "--input_bucket",
+    type=str,
+    help="The path of config file in json format.",
+    required=True,
+)
 
-    parser.add_argument(
-        "--topic_id",
-        type=str,
-        help="The path of config file in json format.",
-        required=True,
-    )
+parser.add_argument(
+    "--output_bucket",
+    type=str,
+    help="The path of config file in json format.",
+    required=True,
+)
 
-    parser.add_argument(
-        "--project_id",
-        type=str,
-        help="The path of config file in json format.",
-        required=True,
-    )
+parser.add_argument(
+    "--topic_id",
+    type=str,
+    help="The path of config file in json format.",
+    required=True,
+)
+
+parser.add_argument(
+    "--project_id",
+    type=str,
+    help="The path of config file in json format.",
+    required=True,
+)
 
+parser.add_argument(
+    "--cache_bucket",
+    type=str,
+    help="The bucket holding cached tuning logs, by default the output bucket.",
+    default=None,
+)
+
+
+if __name__ == "__main__":
     args = parser.parse_args()
 
     run(args)
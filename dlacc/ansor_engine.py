@@ -19,9 +19,14 @@ import onnxruntime as ort
 import pandas as pd
 from pathlib import Path
 import onnx
+import os
+import glob
+import shutil
+import subprocess
 
-from metadata import output_prefix, input_prefix
+from metadata import output_prefix
 from base_class import BaseClass
+from utils import contruct_dummy_input
 
 class AnsorEngine(BaseClass):
     """AnsorEngine based on TVM's auto scheduler module. 
@@ -43,14 +48,34 @@ class AnsorEngine(BaseClass):
         A list of strings describing datatype of input in string format. Should be one of "int32", "int64", "float32", "float64".
     out_json: dict
         The output json dictionnary which contains information about runtime.
+    cache_dir: str
+        The schedule cache folder of this workload. If passed, the Relay module is loaded from it when present and saved to it otherwise.
     """
     def __init__(
-        self, network_name: str, traced_model: onnx.onnx_ml_pb2.ModelProto, target: str, input_shape: list[int], input_dtype: list[str], out_json: dict
+        self, network_name: str, traced_model: onnx.onnx_ml_pb2.ModelProto, target: str, input_shape: list[int], input_dtype: list[str], out_json: dict, cache_dir: str = None
     ) -> None:
         self.network_name = network_name.replace("/", "_")
-        mod, params = relay.frontend.from_onnx(
-            traced_model, shape=input_shape, dtype=input_dtype
-        )
+        mod_file = cache_dir + "/relay_mod.json" if cache_dir else None
+        params_file = cache_dir + "/relay_params.params" if cache_dir else None
+        if mod_file and os.path.isfile(mod_file) and os.path.isfile(params_file):
+            self._print("Load Relay module from %s" % cache_dir)
+            with open(mod_file) as fi:
+                mod = tvm.ir.load_json(fi.read())
+            with open(params_file, "rb") as fi:
+                params = relay.load_param_dict(fi.read())
+        else:
+            mod, params = relay.frontend.from_onnx(
+                traced_model, shape=input_shape, dtype=input_dtype
+            )
+            if cache_dir:
+                # written aside then renamed, so a cache file is never partial
+                Path(cache_dir).mkdir(parents=True, exist_ok=True)
+                with open(params_file + ".tmp", "wb") as fo:
+                    fo.write(relay.save_param_dict(params))
+                os.replace(params_file + ".tmp", params_file)
+                with open(mod_file + ".tmp", "w") as fo:
+                    fo.write(tvm.ir.save_json(mod))
+                os.replace(mod_file + ".tmp", mod_file)
         self.mod = mod
         self.params = params
         self.out_json = out_json
@@ -59,7 +84,14 @@ class AnsorEngine(BaseClass):
         self.input_dtype = input_dtype
         self.onnx_model = traced_model
 
-    def ansor_run_tuning(self, num_measure_trials: int = 500, verbose: int = 0):
+    def ansor_run_tuning(
+        self,
+        num_measure_trials: int = 500,
+        verbose: int = 0,
+        n_parallel: int = None,
+        enable_cpu_cache_flush: bool = False,
+        corpus_dir: str = None,
+    ):
         """Run automatic tuning process. The output json file will be saved in local folder. Its filename will be marked with "finished" if tuning process succeed.
 
         Parameters
@@ -68,6 +100,12 @@ class AnsorEngine(BaseClass):
             The number of measurement trials, by default 500. The search policy measures num_measure_trials schedules in total and returns the best one among them. With num_measure_trials == 0, the policy will do the schedule search but won’t involve measurement. This can be used to get a runnable schedule quickly without auto-tuning.
         verbose : int, optional
             Whether outputing terminal in verbose mode, by default 0.
+        n_parallel : int, optional
+            The number of candidate schedules built in parallel, by default None which means the number of CPUs. Measurements themselves stay sequential so they do not disturb each other.
+        enable_cpu_cache_flush : bool, optional
+            Whether to flush the CPU cache before each measurement, by default False. Each measurement is repeated for at least min_repeat_ms, which already amortizes cold cache effects.
+        corpus_dir : str, optional
+            The schedule cache folder whose <workload key>/tuning.json logs warm start the cost model, by default None which means tuning starts cold.
 
         Returns
         -------
@@ -88,10 +126,19 @@ class AnsorEngine(BaseClass):
 
         self._print("Begin tuning...")
         tuner = auto_scheduler.TaskScheduler(tasks, task_weights)
+        # finished logs of previously tuned workloads, see Optimum._run
+        corpus = (
+            sorted(glob.glob(corpus_dir + "/*/tuning.json")) if corpus_dir else []
+        )
         tune_option = auto_scheduler.TuningOptions(
             num_measure_trials=num_measure_trials,  # change this to 20000 to achieve the best performance
+            builder=auto_scheduler.LocalBuilder(n_parallel=n_parallel or os.cpu_count()),
             runner=auto_scheduler.LocalRunner(
-                repeat=10, enable_cpu_cache_flush=True, timeout=40
+                number=3,
+                repeat=3,
+                min_repeat_ms=150,
+                enable_cpu_cache_flush=enable_cpu_cache_flush,
+                timeout=40,
             ),
             early_stopping=300,
             measure_callbacks=[auto_scheduler.RecordToFile(self.log_file)],
@@ -110,6 +157,31 @@ class AnsorEngine(BaseClass):
                 for task in tasks
             ]
 
+            tuner.tune(tune_option, search_policy=search_policy)
+        elif corpus:
+            self._print("Warm start cost model from %d tuning logs..." % len(corpus))
+            # one merged log, so the model is trained once and each task reads it once
+            corpus_file = corpus_dir + "/corpus.json"
+            with open(corpus_file, "wb") as fo:
+                for log_file in corpus:
+                    with open(log_file, "rb") as fi:
+                        records = fi.read()
+                    if records and not records.endswith(b"\n"):
+                        records += b"\n"
+                    fo.write(records)
+            cost_model = auto_scheduler.XGBModel()
+            cost_model.update_from_file(corpus_file)
+            search_policy = [
+                auto_scheduler.SketchPolicy(
+                    task,
+                    program_cost_model=cost_model,
+                    init_search_callbacks=[
+                        auto_scheduler.PreloadMeasuredStates(corpus_file)
+                    ],
+                )
+                for task in tasks
+            ]
+
             tuner.tune(tune_option, search_policy=search_policy)
         else:
             tuner.tune(tune_option)
@@ -158,7 +230,17 @@ class AnsorEngine(BaseClass):
         return self
 
     def _save(self, output_path, lib, graph, params):
+        # A .tar export only archives the object files, no linker is involved.
         lib.export_library(output_path + "/deploy_lib.tar")
+        if self.out_json.get("compress_lib", False):
+            if shutil.which("zstd"):
+                # multithreaded, replaces deploy_lib.tar with deploy_lib.tar.zst
+                subprocess.run(
+                    ["zstd", "-T0", "-3", "-q", "--rm", output_path + "/deploy_lib.tar"],
+                    check=True,
+                )
+            else:
+                self._print("zstd not found, deploy_lib.tar is left uncompressed.")
         with open(output_path + "/deploy_graph.json", "w") as fo:
             fo.write(graph)
         with open(output_path + "/deploy_param.params", "wb") as fo:
@@ -167,19 +249,44 @@ class AnsorEngine(BaseClass):
     def evaluate(self):
         """Repeat executing prediction while recording time cost. Compared with the not optimized model. May be time consuming."""
         self._print("Evaluate inference time cost...")
+        dummy_input = contruct_dummy_input(self.input_shape, self.input_dtype, "np")
+        # Both runtimes are measured on the same inputs. With end_to_end the
+        # inputs go straight to a PackedFunc, which only accepts NDArrays.
         timing_results = self.module.benchmark(
-            self.device, repeat=5, number=10, end_to_end=True
+            self.device,
+            repeat=5,
+            number=10,
+            min_repeat_ms=200,
+            end_to_end=True,
+            **{k: tvm.nd.array(v, self.device) for k, v in dummy_input.items()},
         )
-        dummy_input = dict(
-            [
-                (k, np.random.rand(*v).astype(self.input_dtype[k]))
-                for k, v in self.input_shape.items()
-            ]
+        sess_options = ort.SessionOptions()
+        sess_options.graph_optimization_level = (
+            ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        # like the TVM module, ORT runs one operator at a time on all cores
+        sess_options.intra_op_num_threads = os.cpu_count()
+        sess_options.inter_op_num_threads = 1
+        sess_options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        ort_sess = ort.InferenceSession(
+            self.onnx_model.SerializeToString(),
+            sess_options=sess_options,
+            providers=["CPUExecutionProvider"],
         )
-        ort_sess = ort.InferenceSession(input_prefix + "/model.onnx")
+        # Bind feeds once so the timed loop skips per-call feed validation.
+        io_binding = ort_sess.io_binding()
+        for k, v in dummy_input.items():
+            io_binding.bind_cpu_input(k, v)
+        output_names = [output.name for output in ort_sess.get_outputs()]
+        for name in output_names:
+            io_binding.bind_output(name)
+        # warm-up run, its outputs are then reused as preallocated buffers
+        ort_sess.run_with_iobinding(io_binding)
+        for name, value in zip(output_names, io_binding.get_outputs()):
+            io_binding.bind_ortvalue_output(name, value)
         to_comp = (
             np.array(
-                timeit.Timer(lambda: ort_sess.run(None, dummy_input)).repeat(
+                timeit.Timer(lambda: ort_sess.run_with_iobinding(io_binding)).repeat(
                     repeat=5, number=10
                 )
             )
@@ -16,3 +16,4 @@ class ModelType(enum.IntEnum):
 
 input_prefix = "../inputs"
 output_prefix = "../outputs"
+cache_prefix = "../inputs/ansor-cache"
@@ -12,15 +12,44 @@
 
 from tvm.contrib import graph_executor
 import tvm
+from pathlib import Path
+import os
+import json
+import shutil
 from ansor_engine import AnsorEngine
 from base_class import BaseClass
+from metadata import cache_prefix
+from utils import get_workload_key, is_cache_hit
 import onnx
+import numpy as np
 
 
 class GraphModuleWrapper:
-    """A wrapper class for graph module. It is the final object for prediction."""    
-    def __init__(self, module: tvm.contrib.graph_executor.GraphModule):
+    """A wrapper class for graph module. It is the final object for prediction.
+
+    Parameters
+    ----------
+    module : tvm.contrib.graph_executor.GraphModule
+        The compiled graph module.
+    reuse_outputs : bool, optional
+        Whether to copy outputs into buffers allocated on the first call, by default False. The returned arrays are then overwritten by the next prediction, copy them to keep them.
+    """
+    def __init__(
+        self, module: tvm.contrib.graph_executor.GraphModule, reuse_outputs: bool = False
+    ):
         self.module = module
+        self.reuse_outputs = reuse_outputs
+        # output name -> (numpy view, tvm buffer owning the memory), allocated on first call
+        self._out_bufs = None
+
+    def _alloc_outputs(self) -> dict:
+        out_bufs = {}
+        for i in range(self.module.get_num_outputs()):
+            output = self.module.get_output(i)
+            # allocated by TVM so it meets its alignment, numpy only views it
+            tvm_buf = tvm.nd.empty(output.shape, output.dtype)
+            out_bufs["output_{}".format(i)] = (np.from_dlpack(tvm_buf), tvm_buf)
+        return out_bufs
 
     def __call__(self, inputs_dict: dict) -> dict:
         """Run prediction.
@@ -37,11 +66,19 @@ class GraphModuleWrapper:
         """
         self.module.set_input(**inputs_dict)
         self.module.run()
-        num_outputs = self.module.get_num_outputs()
+        if not self.reuse_outputs:
+            num_outputs = self.module.get_num_outputs()
+            tvm_outputs = {}
+            for i in range(num_outputs):
+                output_name = "output_{}".format(i)
+                tvm_outputs[output_name] = self.module.get_output(i).numpy()
+            return tvm_outputs
+        if self._out_bufs is None:
+            self._out_bufs = self._alloc_outputs()
         tvm_outputs = {}
-        for i in range(num_outputs):
-            output_name = "output_{}".format(i)
-            tvm_outputs[output_name] = self.module.get_output(i).numpy()
+        for i, (output_name, (buf, tvm_buf)) in enumerate(self._out_bufs.items()):
+            self.module.get_output(i, tvm_buf)
+            tvm_outputs[output_name] = buf
         return tvm_outputs
 
     def predict(self, inputs_dict) -> dict:
@@ -78,7 +115,7 @@ class Optimum(BaseClass):
         """        
         self.model_name = model_name
 
-    def run(self, onnx_model, config: dict):
+    def run(self, onnx_model, config: dict, cache_dir: str = None):
         """Run tuning process.
 
         Parameters
@@ -87,11 +124,23 @@ class Optimum(BaseClass):
                 Onnx model object.
         config: dict
             The output json dictionnary which contains information about runtime.
+        cache_dir: str, optional
+            The local schedule cache folder of this workload, by default None. If not passed, it is derived from the workload key under cache_prefix. The cache is not used at all when tuning_config sets "use_cache" to false.
 
         Returns
         -------
         None
         """
+        if not config["tuning_config"].get("use_cache", True):
+            cache_dir = None
+        elif cache_dir is None:
+            workload_key = get_workload_key(
+                onnx_model,
+                config["model_config"]["input_shape"],
+                config["model_config"]["input_dtype"],
+                config["target"],
+            )
+            cache_dir = cache_prefix + "/" + workload_key
         return self._run(
             onnx_model,
             config["target"],
@@ -102,6 +151,11 @@ class Optimum(BaseClass):
             input_shape=config["model_config"]["input_shape"],
             input_dtype=config["model_config"]["input_dtype"],
             verbose=config["tuning_config"]["verbose_print"],
+            n_parallel=config["tuning_config"].get("n_parallel"),
+            enable_cpu_cache_flush=config["tuning_config"].get(
+                "enable_cpu_cache_flush", False
+            ),
+            cache_dir=cache_dir,
         )
 
     def _run(
@@ -115,8 +169,12 @@ class Optimum(BaseClass):
         input_dtype: list[str]=None,
         log_file: str = None,
         verbose: int = 0,
+        n_parallel: int = None,
+        enable_cpu_cache_flush: bool = False,
+        cache_dir: str = None,
     ):
         """Entrypoint for AnsorEngine. See comments in related methodes in AnsorEngine."""    
+        cached_log = cache_dir + "/tuning.json" if cache_dir else None
         if mode == "ansor":
             ae = AnsorEngine(
                 self.model_name,
@@ -125,6 +183,7 @@ class Optimum(BaseClass):
                 input_shape,
                 input_dtype,
                 out_json,
+                cache_dir=cache_dir,
             )
             if log_file != "":
                 print(
@@ -132,14 +191,35 @@ class Optimum(BaseClass):
                     % log_file
                 )
                 ae.ansor_compile(log_file=log_file)
+            elif cached_log and is_cache_hit(cache_dir, num_measure_trials):
+                print(
+                    "Cached configuration file %s found, tuning will not be executed."
+                    % cached_log
+                )
+                ae.ansor_compile(log_file=cached_log)
             else:
                 ae.ansor_run_tuning(
-                    num_measure_trials=num_measure_trials, verbose=verbose
+                    num_measure_trials=num_measure_trials,
+                    verbose=verbose,
+                    n_parallel=n_parallel,
+                    enable_cpu_cache_flush=enable_cpu_cache_flush,
+                    # the other workloads cached next to this one
+                    corpus_dir=os.path.dirname(cache_dir) if cache_dir else None,
                 )
+                if cached_log:
+                    Path(cache_dir).mkdir(parents=True, exist_ok=True)
+                    shutil.copyfile(ae.log_file, cached_log + ".tmp")
+                    os.replace(cached_log + ".tmp", cached_log)
+                    with open(cache_dir + "/tuning_meta.json.tmp", "w") as fo:
+                        json.dump({"num_measure_trials": num_measure_trials}, fo)
+                    os.replace(
+                        cache_dir + "/tuning_meta.json.tmp",
+                        cache_dir + "/tuning_meta.json",
+                    )
         elif mode == "autotvm":
             raise NotImplementedError
         self.ansor_engine = ae
         self.onnx_model = onnx_model
 
-    def get_model(self):
-        return GraphModuleWrapper(self.ansor_engine.module)
+    def get_model(self, reuse_outputs: bool = False):
+        return GraphModuleWrapper(self.ansor_engine.module, reuse_outputs=reuse_outputs)
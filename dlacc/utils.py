@@ -3,8 +3,10 @@ import os
 import json
 import re
 import glob
+import hashlib
 import numpy as np
 import onnx
+import orjson
 
 from base_class import BaseClass
 from metadata import ModelType
@@ -45,20 +47,66 @@ def contruct_dummy_input(input_shape, input_dtype, tensor_type, device="cuda"):
             for k, v in input_shape.items()
         ]
     else:
-        dummy_input = dict(
-            [
-                (k, np.random.rand(*v).astype(input_dtype[k]))
-                for k, v in input_shape.items()
-            ]
-        )
+        # Generated directly in the input dtype where Generator.random supports
+        # it (float32, float64), other float widths are cast. Integer inputs
+        # are usually indices, so they stay at zero which is always in range.
+        rng = np.random.default_rng()
+        dummy_input = {}
+        for k, v in input_shape.items():
+            dtype = input_dtype[k]
+            if dtype in ("float32", "float64"):
+                dummy_input[k] = rng.random(v, dtype=dtype)
+            elif dtype.startswith("float"):
+                dummy_input[k] = rng.random(v).astype(dtype)
+            else:
+                dummy_input[k] = np.zeros(v, dtype=dtype)
     return dummy_input
 
 
+def get_workload_key(onnx_model, input_shape, input_dtype, target) -> str:
+    """Content-addressed key of a tuning workload.
+
+    Two workloads with the same key produce interchangeable tuning logs, so the key
+    covers the serialized graph, the input signature, the target and the TVM version.
+    """
+    import tvm
+
+    signature = json.dumps(
+        {
+            "input_shape": input_shape,
+            "input_dtype": input_dtype,
+            "target": str(target),
+            "tvm_version": tvm.__version__,
+        },
+        sort_keys=True,
+    )
+    return hashlib.sha256(
+        onnx_model.SerializeToString() + signature.encode("utf-8")
+    ).hexdigest()
+
+
+def get_cached_trials(cache_dir: str):
+    """Number of measure trials behind the cached tuning log of cache_dir, None if there is no usable entry."""
+    if not os.path.isfile(cache_dir + "/tuning.json"):
+        return None
+    try:
+        with open(cache_dir + "/tuning_meta.json") as fi:
+            return int(json.load(fi)["num_measure_trials"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def is_cache_hit(cache_dir: str, num_measure_trials: int) -> bool:
+    """Whether cache_dir holds a tuning log tuned with at least num_measure_trials trials."""
+    cached_trials = get_cached_trials(cache_dir)
+    return cached_trials is not None and cached_trials >= num_measure_trials
+
+
 def get_onnx_model(model_path, model_type):
     if model_type == int(ModelType.ONNX):
         onnx_model = onnx.load(model_path)
     else:
-	raise NotImplementedError
+        raise NotImplementedError
 
     return onnx_model
 
@@ -68,23 +116,47 @@ class JSONConfig(BaseClass):
         self.load(json_path)
 
     def load(self, json_path):
-        with open(json_path) as json_file:
-            self.meta = json.load(json_file)
+        with open(json_path, "rb") as json_file:
+            self.meta = orjson.loads(json_file.read())
 
     def __getitem__(self, key):
         return self.meta[key]
 
 
 class JSONOutput(BaseClass):
-    def __init__(self, json_config: JSONConfig):
+    def __init__(self, json_config: JSONConfig, progress_path: str = None):
         self.meta = json_config.meta
+        self.progress_path = progress_path
+        if progress_path:
+            # the log only describes this job, drop what an earlier run left
+            try:
+                open(progress_path, "wb").close()
+            except OSError as e:
+                self._print("Progress log %s not reset: %s" % (progress_path, e))
 
     def save(self, file_path):
-        with open(file_path, "w") as outfile:
-            json.dump(self.meta, outfile)
+        with open(file_path, "wb") as outfile:
+            outfile.write(orjson.dumps(self.meta, option=orjson.OPT_INDENT_2))
+
+    def save_partial(self, key, file_path=None):
+        """Append the current value of key as one JSON line, save() remains the full snapshot.
+
+        Progress logging is best effort: failures are reported and never raised, since it also runs from error handlers.
+        """
+        try:
+            line = orjson.dumps({key: self.meta[key]}) + b"\n"
+            with open(file_path or self.progress_path, "ab") as outfile:
+                outfile.write(line)
+        except (OSError, TypeError) as e:
+            self._print("Progress of %s not saved: %s" % (key, e))
 
     def __getitem__(self, key):
         return self.meta[key]
 
+    def get(self, key, default=None):
+        return self.meta.get(key, default)
+
     def __setitem__(self, key, value):
         self.meta[key] = value
+        if self.progress_path:
+            self.save_partial(key)
@@ -1,5 +1,8 @@
 import sys
 import os
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# dlacc modules import each other by bare module name
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'dlacc')))
 
-import app
\ No newline at end of file
+import app
+import dlacc
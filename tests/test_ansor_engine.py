@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+from .context import dlacc
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    import onnx
+    from onnx import helper, TensorProto
+    import ansor_engine
+except ImportError:
+    ansor_engine = None
+
+
+def make_add_model():
+    inputs = [
+        helper.make_tensor_value_info(name, TensorProto.FLOAT, [1, 4])
+        for name in ("a", "b")
+    ]
+    output = helper.make_tensor_value_info("c", TensorProto.FLOAT, [1, 4])
+    graph = helper.make_graph(
+        [helper.make_node("Add", ["a", "b"], ["c"])], "add", inputs, [output]
+    )
+    return helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+
+
+@unittest.skipIf(ansor_engine is None, "requires TVM with Relay")
+class AnsorEngineTestSuite(unittest.TestCase):
+    """AnsorEngine test cases."""
+
+    def test_evaluate(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            ansor_engine, "output_prefix", tmp
+        ):
+            log_file = os.path.join(tmp, "empty_log.json")
+            open(log_file, "w").close()
+            out_json = {}
+            ae = ansor_engine.AnsorEngine(
+                "add",
+                make_add_model(),
+                "llvm",
+                {"a": [1, 4], "b": [1, 4]},
+                {"a": "float32", "b": "float32"},
+                out_json,
+            )
+            ae.ansor_compile(log_file=log_file)
+            ae.evaluate()
+            self.assertEqual(out_json["status"], 3)
+            self.assertTrue(os.path.isfile(os.path.join(tmp, "inference_time.csv")))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,12 @@
 from .context import app
 from app import helpers
 
+import os
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
 
 
 class HelpersTestSuite(unittest.TestCase):
@@ -13,6 +18,103 @@ class HelpersTestSuite(unittest.TestCase):
         #result = helpers.publish_message("", "", "OK", "10001", "")
         self.assertIsNone(None)
 
+    def test_get_bucket_object_name(self):
+        self.assertEqual(
+            helpers.get_bucket_object_name("gs://bucket/job_id=1/config.json"),
+            ("bucket", "job_id=1/config.json"),
+        )
+        with self.assertRaises(Exception):
+            helpers.get_bucket_object_name("s3://bucket/config.json")
+
+    def test_iter_files(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.makedirs(os.path.join(tmp, "optimized_model"))
+            for name in ("output_json.json", "optimized_model/deploy_lib.tar"):
+                open(os.path.join(tmp, name), "w").close()
+            files = sorted(os.path.relpath(f, tmp) for f in helpers.iter_files(tmp))
+        self.assertEqual(
+            files,
+            [os.path.join("optimized_model", "deploy_lib.tar"), "output_json.json"],
+        )
+
+    def test_client_created_once(self):
+        created = []
+
+        def slow_client():
+            created.append(1)
+            time.sleep(0.1)
+            return mock.MagicMock()
+
+        with mock.patch.object(helpers, "_storage_client", None), mock.patch.object(
+            helpers.storage, "Client", side_effect=slow_client
+        ):
+            threads = [threading.Thread(target=helpers._client) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(created), 1)
+
+    def _make_output_dir(self, tmp):
+        os.makedirs(os.path.join(tmp, "outputs", "optimized_model"))
+        for name in ("output_json.json", "optimized_model/deploy_lib.tar"):
+            open(os.path.join(tmp, "outputs", name), "w").close()
+        return os.path.join(tmp, "outputs")
+
+    def test_upload_blobs_from_directory(self):
+        client = mock.MagicMock()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            helpers, "_client", return_value=client
+        ):
+            helpers.upload_blobs_from_directory(
+                self._make_output_dir(tmp), "bucket", "job_id=1"
+            )
+        client.bucket.assert_called_once_with("bucket")
+        remote_paths = sorted(
+            call.args[0] for call in client.bucket.return_value.blob.call_args_list
+        )
+        self.assertEqual(
+            remote_paths,
+            ["job_id=1/optimized_model/deploy_lib.tar", "job_id=1/output_json.json"],
+        )
+
+    def test_upload_blobs_from_directory_failure(self):
+        client = mock.MagicMock()
+        blob = client.bucket.return_value.blob.return_value
+        blob.upload_from_filename.side_effect = OSError("upload failed")
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            helpers, "_client", return_value=client
+        ):
+            with self.assertRaises(OSError):
+                helpers.upload_blobs_from_directory(
+                    self._make_output_dir(tmp), "bucket", "job_id=1"
+                )
+
+    def test_download_blobs_to_directory(self):
+        client = mock.MagicMock()
+        blobs = []
+        for name, updated in (
+            ("ansor-cache/old/tuning.json", 1),
+            ("ansor-cache/new/tuning.json", 3),
+            ("ansor-cache/new/relay_mod.json", 2),
+        ):
+            blob = mock.MagicMock(updated=updated)
+            blob.name = name
+            blobs.append(blob)
+        client.list_blobs.return_value = blobs
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(
+            helpers, "_client", return_value=client
+        ):
+            helpers.download_blobs_to_directory(
+                "bucket", "ansor-cache", tmp, suffix="/tuning.json", max_blobs=1
+            )
+        client.list_blobs.assert_called_once_with("bucket", prefix="ansor-cache/")
+        blobs[0].download_to_filename.assert_not_called()
+        blobs[1].download_to_filename.assert_called_once_with(
+            os.path.join(tmp, "new", "tuning.json")
+        )
+        blobs[2].download_to_filename.assert_not_called()
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -2,8 +2,20 @@
 
 from .context import app
 from app import main
+from app import helpers
+import dlacc.metadata
+import dlacc.utils
 
+import argparse
+import json
+import os
+import sys
+import tempfile
 import unittest
+from unittest import mock
+
+import onnx
+from onnx import helper, TensorProto
 
 
 class MainTestSuite(unittest.TestCase):
@@ -12,6 +24,96 @@ class MainTestSuite(unittest.TestCase):
     def test_main(self):
         self.assertIsNone(None)
 
+    def test_cache_snapshot(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertEqual(main.cache_snapshot(os.path.join(tmp, "missing")), {})
+            for name in ("tuning.json", "tuning_meta.json", "relay_mod.json.tmp"):
+                open(os.path.join(tmp, name), "w").close()
+            self.assertEqual(
+                sorted(main.cache_snapshot(tmp)), ["tuning.json", "tuning_meta.json"]
+            )
+
+    def _write_job(self, tmp):
+        os.makedirs(os.path.join(tmp, "inputs"))
+        os.makedirs(os.path.join(tmp, "outputs"))
+        inputs = [helper.make_tensor_value_info("a", TensorProto.FLOAT, [1, 4])]
+        output = helper.make_tensor_value_info("b", TensorProto.FLOAT, [1, 4])
+        graph = helper.make_graph(
+            [helper.make_node("Relu", ["a"], ["b"])], "relu", inputs, [output]
+        )
+        model = helper.make_model(graph)
+        onnx.save(model, os.path.join(tmp, "inputs", "model.onnx"))
+        with open(os.path.join(tmp, "inputs", "config.json"), "w") as f:
+            json.dump(
+                {
+                    "model_name": "relu",
+                    "model_type": 2,
+                    "target": "llvm",
+                    "model_config": {
+                        "input_shape": {"a": [1, 4]},
+                        "input_dtype": {"a": "float32"},
+                    },
+                    "tuning_config": {"mode": "ansor", "num_measure_trials": 10},
+                    "tuned_log": "",
+                    "need_benchmark": False,
+                },
+                f,
+            )
+        return model
+
+    def test_run_onnx(self):
+        args = argparse.Namespace(
+            env=1,
+            job_id=1,
+            input_bucket="input",
+            output_bucket="output",
+            topic_id="topic",
+            project_id="project",
+            cache_bucket=None,
+        )
+        fake_optimum = mock.MagicMock()
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.multiple(
+            dlacc.metadata,
+            input_prefix=os.path.join(tmp, "inputs"),
+            output_prefix=os.path.join(tmp, "outputs"),
+            cache_prefix=os.path.join(tmp, "cache"),
+        ), mock.patch.multiple(
+            helpers,
+            download_file_from_gcp=mock.DEFAULT,
+            download_blobs_to_directory=mock.DEFAULT,
+            upload_blob=mock.DEFAULT,
+            upload_blobs_from_directory=mock.DEFAULT,
+            publish_message=mock.DEFAULT,
+        ) as gcs, mock.patch.object(
+            dlacc.utils, "get_workload_key", return_value="key"
+        ), mock.patch.object(
+            dlacc.utils, "get_onnx_model"
+        ) as get_onnx_model, mock.patch.object(
+            dlacc.utils, "JSONConfig", wraps=dlacc.utils.JSONConfig
+        ) as json_config, mock.patch.dict(
+            sys.modules, {"dlacc.optimum": fake_optimum}
+        ):
+            model = self._write_job(tmp)
+            main.run(args)
+
+            json_config.assert_called_once_with(
+                os.path.join(tmp, "inputs", "config.json")
+            )
+            self.assertEqual(gcs["download_file_from_gcp"].call_count, 2)
+            # ONNX inputs are parsed directly, without the conversion path
+            get_onnx_model.assert_not_called()
+            onnx_model = fake_optimum.Optimum.return_value.run.call_args.args[0]
+            self.assertEqual(onnx_model, model)
+            # empty cache, so the corpus is fetched after the workload entry
+            cache_downloads = gcs["download_blobs_to_directory"].call_args_list
+            self.assertEqual(
+                [call.args[1] for call in cache_downloads],
+                ["ansor-cache/key", "ansor-cache"],
+            )
+            gcs["publish_message"].assert_called_once_with(
+                "project", "topic", "OK", job_id=1, job_status="4"
+            )
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from .context import dlacc
+
+import unittest
+
+import numpy as np
+
+try:
+    import tvm
+    import optimum
+except ImportError:
+    optimum = None
+
+
+class FakeGraphModule:
+    """Returns the last input plus one as its single output."""
+
+    def set_input(self, x):
+        self.x = x
+
+    def run(self):
+        self.y = tvm.nd.array(self.x + 1)
+
+    def get_num_outputs(self):
+        return 1
+
+    def get_output(self, index, out=None):
+        if out is None:
+            return self.y
+        self.y.copyto(out)
+        return out
+
+
+@unittest.skipIf(optimum is None, "requires TVM with Relay")
+class GraphModuleWrapperTestSuite(unittest.TestCase):
+    """GraphModuleWrapper test cases."""
+
+    def test_outputs_are_independent_by_default(self):
+        model = optimum.GraphModuleWrapper(FakeGraphModule())
+        outputs = [model({"x": np.full((2,), v, "float32")}) for v in (0, 1)]
+        np.testing.assert_array_equal(outputs[0]["output_0"], [1, 1])
+        np.testing.assert_array_equal(outputs[1]["output_0"], [2, 2])
+
+    def test_reuse_outputs(self):
+        model = optimum.GraphModuleWrapper(FakeGraphModule(), reuse_outputs=True)
+        first = model({"x": np.zeros((2,), "float32")})["output_0"]
+        second = model({"x": np.ones((2,), "float32")})["output_0"]
+        self.assertIs(first, second)
+        np.testing.assert_array_equal(second, [2, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
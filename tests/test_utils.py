@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+
+from .context import dlacc
+import utils
+
+import json
+import os
+import tempfile
+import unittest
+
+
+class UtilsTestSuite(unittest.TestCase):
+    """Utils test cases."""
+
+    def test_json_output_save(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            with open(os.path.join(tmp, "config.json"), "w") as f:
+                json.dump({"model_name": "CDAE", "status": 0}, f)
+            out_json = utils.JSONOutput(utils.JSONConfig(os.path.join(tmp, "config.json")))
+            out_json["status"] = 4
+            out_json.save(os.path.join(tmp, "output_json.json"))
+            with open(os.path.join(tmp, "output_json.json")) as f:
+                self.assertEqual(json.load(f), {"model_name": "CDAE", "status": 4})
+
+    def _make_config(self, tmp):
+        with open(os.path.join(tmp, "config.json"), "w") as f:
+            json.dump({"model_name": "CDAE", "status": 0}, f)
+        return utils.JSONConfig(os.path.join(tmp, "config.json"))
+
+    def test_json_output_progress(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            progress_path = os.path.join(tmp, "output_json.progress.jsonl")
+            # left over by a previous job in the same folder
+            with open(progress_path, "w") as f:
+                f.write('{"status": 4}\n')
+            out_json = utils.JSONOutput(self._make_config(tmp), progress_path=progress_path)
+            out_json["status"] = 1
+            out_json["error_info"] = "failed"
+            out_json.save_partial("model_name")
+            with open(progress_path) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(
+            [json.loads(line) for line in lines],
+            [{"status": 1}, {"error_info": "failed"}, {"model_name": "CDAE"}],
+        )
+
+    def test_json_output_progress_failure(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            progress_path = os.path.join(tmp, "missing", "output_json.progress.jsonl")
+            out_json = utils.JSONOutput(self._make_config(tmp), progress_path=progress_path)
+            # the unwritable progress log must not break status updates
+            out_json["status"] = -1
+        self.assertEqual(out_json["status"], -1)
+
+    def test_contruct_dummy_input(self):
+        input_shape = {"a": [2, 3], "b": [2], "c": [4]}
+        input_dtype = {"a": "float32", "b": "float16", "c": "int64"}
+        dummy_input = utils.contruct_dummy_input(input_shape, input_dtype, "np")
+        for k, v in input_shape.items():
+            self.assertEqual(dummy_input[k].shape, tuple(v))
+            self.assertEqual(dummy_input[k].dtype, input_dtype[k])
+        self.assertTrue(((dummy_input["b"] >= 0) & (dummy_input["b"] <= 1)).all())
+        self.assertFalse(dummy_input["c"].any())
+
+    def test_get_cached_trials(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            self.assertIsNone(utils.get_cached_trials(tmp))
+            open(os.path.join(tmp, "tuning.json"), "w").close()
+            # logs cached before the budget was recorded do not count
+            self.assertIsNone(utils.get_cached_trials(tmp))
+            with open(os.path.join(tmp, "tuning_meta.json"), "w") as f:
+                json.dump({"num_measure_trials": 20000}, f)
+            self.assertEqual(utils.get_cached_trials(tmp), 20000)
+
+    def test_is_cache_hit(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            # a zero-trial job must not treat an empty cache as a hit
+            self.assertFalse(utils.is_cache_hit(tmp, 0))
+            open(os.path.join(tmp, "tuning.json"), "w").close()
+            with open(os.path.join(tmp, "tuning_meta.json"), "w") as f:
+                json.dump({"num_measure_trials": 10}, f)
+            self.assertTrue(utils.is_cache_hit(tmp, 0))
+            self.assertTrue(utils.is_cache_hit(tmp, 10))
+            self.assertFalse(utils.is_cache_hit(tmp, 20000))
+
+
+if __name__ == '__main__':
+    unittest.main()